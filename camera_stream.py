@@ -1,12 +1,14 @@
 import cv2
 import threading
 import time
+from collections import deque
 
 class CameraStream:
     _instances = {} 
     _lock = threading.Lock()
 
-    def __new__(cls, src=0, width=None, height=None):
+    def __new__(cls, src=0, width=None, height=None,
+                buffer_seconds=0, buffer_fps=10, buffer_max_bytes=32 * 1024 * 1024, buffer_max_width=960):
         #create unique key for this camera source
         src_key = str(src)
         
@@ -25,6 +27,16 @@ class CameraStream:
                     instance.frame = None
                     instance.stopped = False
                     instance.read_lock = threading.Lock()
+
+                    #ring buffer of recent JPEG frames for event clips (disabled when buffer_seconds is 0)
+                    instance.buffer_seconds = buffer_seconds
+                    instance.buffer_interval = 1.0 / buffer_fps if buffer_fps else 0
+                    instance.buffer_max_bytes = buffer_max_bytes
+                    instance.buffer_max_width = buffer_max_width
+                    instance.buffer = deque(maxlen=int(buffer_seconds * buffer_fps) or None) if buffer_seconds else None
+                    instance.buffer_bytes = 0
+                    instance.buffer_lock = threading.Lock()
+                    instance._last_eviction_warning = 0
                     
                     #waiting for first frame
                     if instance.cap.isOpened():
@@ -40,6 +52,12 @@ class CameraStream:
                     #starting the thread
                     instance.t = threading.Thread(target=instance.update, daemon=True)
                     instance.t.start()
+
+                    #JPEG encoding runs in its own thread so capture never waits on it
+                    instance.buffer_t = None
+                    if instance.buffer is not None:
+                        instance.buffer_t = threading.Thread(target=instance.buffer_loop, daemon=True)
+                        instance.buffer_t.start()
                     
                     cls._instances[src_key] = instance
         
@@ -62,6 +80,64 @@ class CameraStream:
             else:
                 time.sleep(0.01)
 
+    def buffer_loop(self):
+        """Sample the latest frame at buffer_fps and push it into the ring buffer."""
+        next_sample = time.time()
+        while not self.stopped:
+            now = time.time()
+            if now < next_sample:
+                time.sleep(next_sample - now)
+                continue
+            next_sample = max(next_sample + self.buffer_interval, now)
+
+            with self.read_lock:
+                frame = self.frame
+            if frame is not None:
+                self._buffer_frame(frame, now)
+
+    def _buffer_frame(self, frame, ts):
+        """
+        Store a downscaled, JPEG-compressed copy of the frame in the ring buffer.
+        Frame count is capped by the deque's maxlen and total size by buffer_max_bytes,
+        so memory per camera stays fixed regardless of event rate.
+        """
+        h, w = frame.shape[:2]
+        if self.buffer_max_width and w > self.buffer_max_width:
+            scale = self.buffer_max_width / w
+            frame = cv2.resize(frame, (self.buffer_max_width, int(h * scale)), interpolation=cv2.INTER_AREA)
+
+        ret, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        if not ret:
+            return
+        data = jpeg.tobytes()
+
+        evicted_in_window = False
+        with self.buffer_lock:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.buffer_bytes -= len(self.buffer[0][1])
+            self.buffer.append((ts, data))
+            self.buffer_bytes += len(data)
+            while self.buffer_bytes > self.buffer_max_bytes and len(self.buffer) > 1:
+                old_ts, old = self.buffer.popleft()
+                self.buffer_bytes -= len(old)
+                if old_ts > ts - self.buffer_seconds:
+                    evicted_in_window = True
+
+        #byte cap is cutting into the clip window, warn at most once a minute
+        if evicted_in_window and ts - self._last_eviction_warning > 60:
+            self._last_eviction_warning = ts
+            with self.buffer_lock:
+                held = ts - self.buffer[0][0]
+            print(f"[WARN] Camera {self.src} clip buffer full: holds {held:.1f}s of {self.buffer_seconds}s. "
+                  f"Raise clip_buffer_max_mb or lower clip_max_width.")
+
+    def get_buffered(self, start_ts, end_ts):
+        """Return buffered (timestamp, jpeg_bytes) pairs captured between start_ts and end_ts."""
+        if self.buffer is None:
+            return []
+        with self.buffer_lock:
+            return [(ts, data) for ts, data in self.buffer if start_ts <= ts <= end_ts]
+
     def read(self):
         with self.read_lock:
             if self.frame is not None:
@@ -72,5 +148,7 @@ class CameraStream:
         self.stopped = True
         if self.t.is_alive():
             self.t.join()
+        if self.buffer_t is not None and self.buffer_t.is_alive():
+            self.buffer_t.join()
         if self.cap.isOpened():
             self.cap.release()
@@ -2,15 +2,18 @@ import sys
 import os
 import json
 import time
+import hashlib
 import cv2
-from flask import Flask, render_template, Response, request, jsonify, send_from_directory
+from flask import Flask, render_template, Response, request, jsonify, send_from_directory, abort
+from werkzeug.security import safe_join
 
 #add parent directory to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 #local imports
-from utils import save_user_image, get_all_users, delete_user_data, get_user_images
+from utils import save_user_image, get_all_users, delete_user_data, get_user_images, get_intruder_files, paginate, read_intruder_clip, IMAGE_EXTS
 from camera_stream import CameraStream
+from thumbnail_cache import ThumbnailCache
 
 app = Flask(__name__)
 
@@ -30,6 +33,16 @@ CAM_INDEX = cfg.get("camera_index", 0)
 MATCH_THRESHOLD = cfg.get("match_threshold", 70)
 FRAME_W = cfg.get("frame_width", 640)
 FRAME_H = cfg.get("frame_height", 480)
+USERS_DIR = os.path.join(BASE_DIR, "data", "users")
+INTRUDER_DIR = os.path.join(BASE_DIR, cfg.get("save_intruder_path", "data/intruders"))
+PAGE_SIZE = cfg.get("gallery_page_size", 24)
+IMAGE_MAX_AGE = 3600  # seconds browsers may reuse images at a versioned / never-reused URL
+
+#thumbnail cache for gallery pages
+thumbnails = ThumbnailCache(
+    max_size=cfg.get("thumbnail_size", 200),
+    max_bytes=int(cfg.get("thumbnail_cache_mb", 16) * 1024 * 1024)
+)
 
 #frame provider for annotated (bounding box) frames
 annotated_frame_provider = None
@@ -123,6 +136,63 @@ def generate_device_camera_frames():
                b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
 
 
+#helpers for cached images and gallery pages
+def get_page():
+    return request.args.get('page', 1, type=int)
+
+def gallery_response(template, page_items, last_modified, **context):
+    """
+    Render a gallery page with an ETag derived from the listed items,
+    so unchanged pages are answered with 304 Not Modified.
+    """
+    response = Response(render_template(template, **context))
+    etag_src = "|".join([template, str(context.get("page")), str(context.get("total_pages"))] + list(page_items))
+    response.set_etag(hashlib.md5(etag_src.encode()).hexdigest())
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def dir_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+def file_version(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+def set_user_image_caching(response):
+    """
+    User images are overwritten in place on re-enrolment. Requests carrying
+    ?v=<mtime> can be cached; plain URLs must revalidate via ETag/Last-Modified.
+    """
+    if request.args.get('v'):
+        response.cache_control.max_age = IMAGE_MAX_AGE
+    else:
+        response.cache_control.max_age = None
+        response.cache_control.no_cache = True
+        response.expires = None
+    return response
+
+def thumbnail_response(path):
+    if path is None:
+        abort(404)
+    result = thumbnails.get(path)
+    if result is None:
+        abort(404)
+    data, mtime = result
+
+    response = Response(data, mimetype='image/jpeg')
+    response.set_etag(hashlib.md5(data).hexdigest())
+    response.last_modified = mtime
+    response.cache_control.max_age = IMAGE_MAX_AGE
+    return response.make_conditional(request)
+
+
 #routes
 @app.route('/')
 def home():
@@ -130,8 +200,11 @@ def home():
 
 @app.route('/view_users')
 def view_users():
-    users = get_all_users()
-    return render_template("view_users.html", users=users)
+    users, page, total_pages = paginate(get_all_users(), get_page(), PAGE_SIZE)
+    return gallery_response(
+        "view_users.html", users, dir_mtime(USERS_DIR),
+        users=users, page=page, total_pages=total_pages
+    )
 
 @app.route('/refresh_recognizer', methods=['POST'])
 def refresh_recognizer():
@@ -154,8 +227,17 @@ def monitor():
 
 @app.route('/user/<username>')
 def user_details(username):
-    images = get_user_images(username)
-    return render_template("user_details.html", username=username, images=images)
+    user_dir = safe_join(USERS_DIR, username)
+    if user_dir is None or not os.path.isdir(user_dir):
+        abort(404)
+    images, page, total_pages = paginate(get_user_images(username), get_page(), PAGE_SIZE)
+    thumbnails.prefetch(os.path.join(user_dir, img) for img in images)
+    #version in the image URLs so an overwritten img_<n>.jpg gets a new URL
+    versions = {img: file_version(os.path.join(user_dir, img)) for img in images}
+    return gallery_response(
+        "user_details.html", [f"{img}:{v}" for img, v in versions.items()], dir_mtime(user_dir),
+        username=username, images=images, versions=versions, page=page, total_pages=total_pages
+    )
 
 @app.route('/delete_user/<username>', methods=['POST'])
 def delete_user(username):
@@ -166,7 +248,57 @@ def delete_user(username):
 @app.route('/user_img/<username>/<filename>')
 def get_image(username, filename):
     data_dir = os.path.join(BASE_DIR, 'data', 'users', username)
-    return send_from_directory(data_dir, filename)
+    return set_user_image_caching(send_from_directory(data_dir, filename))
+
+@app.route('/user_thumb/<username>/<filename>')
+def get_thumbnail(username, filename):
+    return set_user_image_caching(thumbnail_response(safe_join(USERS_DIR, username, filename)))
+
+@app.route('/intruders')
+def intruders():
+    files = get_intruder_files(INTRUDER_DIR)
+    names = set(files)
+    images = [f for f in files if f.lower().endswith(IMAGE_EXTS)]
+    images, page, total_pages = paginate(images, get_page(), PAGE_SIZE)
+    events = []
+    for img in images:
+        clip = os.path.splitext(img)[0] + ".avi"
+        events.append({"image": img, "clip": clip if clip in names else None})
+    thumbnails.prefetch(os.path.join(INTRUDER_DIR, img) for img in images)
+    return gallery_response(
+        "intruders.html", [f"{e['image']}:{e['clip']}" for e in events], dir_mtime(INTRUDER_DIR),
+        events=events, page=page, total_pages=total_pages
+    )
+
+@app.route('/intruder_img/<filename>')
+def get_intruder_file(filename):
+    mimetype = 'video/x-msvideo' if filename.lower().endswith('.avi') else None
+    return send_from_directory(INTRUDER_DIR, filename, mimetype=mimetype, max_age=IMAGE_MAX_AGE)
+
+@app.route('/intruder_clip/<filename>')
+def play_intruder_clip(filename):
+    """
+    Plays a saved MJPEG AVI clip in the browser at its recorded frame rate,
+    using the same multipart stream as the live feed.
+    """
+    path = safe_join(INTRUDER_DIR, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    fps, frames = read_intruder_clip(path)
+    if not frames:
+        abort(404)
+
+    def generate():
+        for frame_bytes in frames:
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+            time.sleep(1.0 / fps)
+
+    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/intruder_thumb/<filename>')
+def get_intruder_thumbnail(filename):
+    return thumbnail_response(safe_join(INTRUDER_DIR, filename))
 
 @app.route('/video_feed')
 def video_feed():
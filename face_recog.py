@@ -5,6 +5,7 @@ import numpy as np
 import threading
 import insightface
 from insightface.app import FaceAnalysis
+from insightface.app.common import Face
 
 #global shared frame
 processed_frame = None
@@ -100,9 +101,241 @@ def cosine_similarity(a, b):
     b = b / np.linalg.norm(b)
     return np.dot(a, b)
 
+#region-of-interest + adaptive tiled detection (per camera)
+
+def _nms(dets, iou_threshold=0.4):
+    """Non-maximum suppression on (N, 5) [x1, y1, x2, y2, score] boxes, returns kept indices."""
+    x1, y1, x2, y2, scores = dets[:, 0], dets[:, 1], dets[:, 2], dets[:, 3], dets[:, 4]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        inter = np.maximum(0.0, xx2 - xx1 + 1) * np.maximum(0.0, yy2 - yy1 + 1)
+        iou = inter / (areas[i] + areas[order[1:]] - inter)
+        order = order[1:][iou <= iou_threshold]
+    return keep
+
+
+class RegionDetector:
+    """
+    Detects faces only inside configured zones, and re-runs detection at higher
+    resolution in a few tiles where there is unexplained motion or a small
+    (distant) face was found on the previous pass.
+    Zones are normalized [x1, y1, x2, y2] (0..1); no zones means the full frame.
+    """
+
+    def __init__(self, zones=None, tile_size=640, tile_det_size=320, max_tiles=1,
+                 motion_threshold=0.01, min_face_size=32):
+        self.zones = self._validate_zones(zones or [])
+        self.tile_size = tile_size
+        self.tile_det_size = (tile_det_size, tile_det_size)
+        self.max_tiles = max_tiles
+        self.motion_threshold = motion_threshold
+        self.min_face_size = min_face_size  # smallest face (det input px) the base pass finds reliably
+        self.prev_gray = None
+        self.prev_tracks = []
+        self.tile_turn = 0  # rotates candidate tiles so each gets a turn within the budget
+
+    @staticmethod
+    def _validate_zones(zones):
+        valid = []
+        for zone in zones:
+            try:
+                zx1, zy1, zx2, zy2 = (min(max(float(v), 0.0), 1.0) for v in zone)
+            except (TypeError, ValueError):
+                print(f"[WARN] Ignoring malformed detection zone {zone!r} (expected [x1, y1, x2, y2])")
+                continue
+            if zx2 <= zx1 or zy2 <= zy1:
+                print(f"[WARN] Ignoring empty detection zone {zone!r}")
+                continue
+            valid.append((zx1, zy1, zx2, zy2))
+        if zones and not valid:
+            print("[WARN] No valid detection zones, using the full frame.")
+        return valid
+
+    def _zone_rects(self, frame):
+        h, w = frame.shape[:2]
+        if not self.zones:
+            return [(0, 0, w, h)]
+        rects = []
+        for zx1, zy1, zx2, zy2 in self.zones:
+            x1, y1 = min(int(zx1 * w), w), min(int(zy1 * h), h)
+            x2, y2 = min(int(zx2 * w), w), min(int(zy2 * h), h)
+            if x2 > x1 and y2 > y1:
+                rects.append((x1, y1, x2, y2))
+        return rects
+
+    def _small_face_limit(self, rect):
+        #face height (frame px) below which the base pass over this zone is unreliable
+        base_size = app.det_model.input_size[0] if app.det_model.input_size else 320
+        return self.min_face_size * max(rect[2] - rect[0], rect[3] - rect[1]) / base_size
+
+    def _is_small(self, box, zone_rects):
+        cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+        for rect in zone_rects:
+            if rect[0] <= cx < rect[2] and rect[1] <= cy < rect[3]:
+                return box[3] - box[1] < self._small_face_limit(rect)
+        return False
+
+    def _tiles(self, rect):
+        #overlapping tiles; faces cut by a tile edge are dropped and found whole in a neighbour
+        x1, y1, x2, y2 = rect
+        stride = int(self.tile_size * 0.75)
+
+        def starts(lo, hi):
+            if hi - lo <= self.tile_size:
+                return [lo]
+            return list(range(lo, hi - self.tile_size, stride)) + [hi - self.tile_size]
+
+        return [
+            (tx, ty, min(tx + self.tile_size, x2), min(ty + self.tile_size, y2))
+            for ty in starts(y1, y2) for tx in starts(x1, x2)
+        ]
+
+    def _motion_mask(self, frame):
+        #motion on a small grayscale copy, cheap compared to detection
+        h, w = frame.shape[:2]
+        scale = 160.0 / max(h, w)
+        small = cv2.resize(frame, (max(int(w * scale), 1), max(int(h * scale), 1)), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        mask = None
+        if self.prev_gray is not None and self.prev_gray.shape == gray.shape:
+            mask = cv2.absdiff(gray, self.prev_gray) > 25
+        self.prev_gray = gray
+        return mask, scale
+
+    def _select_tiles(self, frame, zone_rects, large_boxes):
+        mask, scale = self._motion_mask(frame)
+
+        #motion around a face the base pass already found (head + body) needs no tile
+        if mask is not None:
+            for bx1, by1, bx2, by2 in large_boxes:
+                bw, bh = bx2 - bx1, by2 - by1
+                x1, y1 = max(int((bx1 - bw) * scale), 0), max(int((by1 - bh) * scale), 0)
+                x2, y2 = int((bx2 + bw) * scale) + 1, int((by2 + 4 * bh) * scale) + 1
+                mask[y1:y2, x1:x2] = False
+
+        tracked_tiles, motion_tiles = [], []
+        for rect in zone_rects:
+            #tiling only helps when the zone is downscaled more than a tile would be
+            if max(rect[2] - rect[0], rect[3] - rect[1]) <= self.tile_size:
+                continue
+
+            for tile in self._tiles(rect):
+                tx1, ty1, tx2, ty2 = tile
+                tracked = any(
+                    tx1 <= (bx1 + bx2) / 2 < tx2 and ty1 <= (by1 + by2) / 2 < ty2
+                    for bx1, by1, bx2, by2 in self.prev_tracks
+                )
+                motion = 0.0
+                if mask is not None:
+                    region = mask[int(ty1 * scale):int(ty2 * scale) + 1, int(tx1 * scale):int(tx2 * scale) + 1]
+                    motion = float(region.mean()) if region.size else 0.0
+
+                if tracked:
+                    tracked_tiles.append((tile, rect))
+                elif motion >= self.motion_threshold:
+                    motion_tiles.append((tile, rect))
+
+        #fixed budget per processed frame: tracked tiles first, each group taking turns across frames
+        def rotate(tiles):
+            if not tiles:
+                return tiles
+            start = self.tile_turn % len(tiles)
+            return tiles[start:] + tiles[:start]
+
+        self.tile_turn += 1
+        return (rotate(tracked_tiles) + rotate(motion_tiles))[:self.max_tiles]
+
+    def _detect_region(self, frame, rect, input_size=None):
+        x1, y1, x2, y2 = rect
+        bboxes, kpss = app.det_model.detect(frame[y1:y2, x1:x2], input_size=input_size, max_num=0, metric='default')
+        if bboxes.shape[0] == 0:
+            return bboxes, kpss
+
+        #back to full-frame coordinates
+        bboxes[:, [0, 2]] += x1
+        bboxes[:, [1, 3]] += y1
+        if kpss is not None:
+            kpss[:, :, 0] += x1
+            kpss[:, :, 1] += y1
+        return bboxes, kpss
+
+    @staticmethod
+    def _inside_tile(bboxes, tile, zone, margin=2):
+        """Mask of boxes not touching an interior tile edge (i.e. not truncated by the tile)."""
+        tx1, ty1, tx2, ty2 = tile
+        keep = np.ones(bboxes.shape[0], dtype=bool)
+        if tx1 > zone[0]:
+            keep &= bboxes[:, 0] > tx1 + margin
+        if ty1 > zone[1]:
+            keep &= bboxes[:, 1] > ty1 + margin
+        if tx2 < zone[2]:
+            keep &= bboxes[:, 2] < tx2 - margin
+        if ty2 < zone[3]:
+            keep &= bboxes[:, 3] < ty2 - margin
+        return keep
+
+    def detect(self, frame):
+        """Return InsightFace Face objects (in frame coordinates) with embeddings."""
+        zone_rects = self._zone_rects(frame)
+        all_boxes, all_kps = [], []
+
+        def collect(bboxes, kpss):
+            if bboxes.shape[0] == 0:
+                return
+            all_boxes.append(bboxes)
+            all_kps.append(kpss if kpss is not None else np.zeros((bboxes.shape[0], 5, 2), dtype=np.float32))
+
+        #base pass over each zone at the normal det_size
+        for rect in zone_rects:
+            collect(*self._detect_region(frame, rect))
+
+        large_boxes = [
+            tuple(b[0:4]) for boxes in all_boxes for b in boxes
+            if not self._is_small(b, zone_rects)
+        ]
+
+        #high-res pass on the few tiles that need it
+        for tile, zone in self._select_tiles(frame, zone_rects, large_boxes):
+            bboxes, kpss = self._detect_region(frame, tile, self.tile_det_size)
+            if bboxes.shape[0] == 0:
+                continue
+            keep = self._inside_tile(bboxes, tile, zone)
+            collect(bboxes[keep], kpss[keep] if kpss is not None else None)
+
+        if not all_boxes:
+            self.prev_tracks = []
+            return []
+
+        bboxes = np.vstack(all_boxes)
+        kpss = np.vstack(all_kps)
+        keep = _nms(bboxes)
+
+        faces = []
+        for i in keep:
+            face = Face(bbox=bboxes[i, 0:4], kps=kpss[i], det_score=bboxes[i, 4])
+            for taskname, model in app.models.items():
+                if taskname == 'detection':
+                    continue
+                model.get(frame, face)
+            faces.append(face)
+
+        #only distant faces need a tile next time; large ones are found by the base pass
+        self.prev_tracks = [tuple(f.bbox) for f in faces if self._is_small(f.bbox, zone_rects)]
+        return faces
+
+
 #recognize and process frame
-def recognize_and_process(frame, user_embeddings, label_to_name, threshold=0.45):
-    faces = app.get(frame)
+def recognize_and_process(frame, user_embeddings, label_to_name, threshold=0.45, detector=None):
+    faces = detector.detect(frame) if detector is not None else app.get(frame)
     processed = frame.copy()
     results = []
 
@@ -140,6 +373,7 @@ def recognize_and_process(frame, user_embeddings, label_to_name, threshold=0.45)
         results.append({
             "name": identity,
             "score": float(best_score),
+            "det_score": float(face.det_score),
             "box": (x1, y1, x2-x1, y2-y1)
         })
 
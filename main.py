@@ -4,8 +4,8 @@ import os
 import threading
 
 from camera_stream import CameraStream
-from face_recog import train_recognizer, recognize_and_process, get_processed_frame
-from utils import save_intruder_image, send_telegram_alert
+from face_recog import train_recognizer, recognize_and_process, get_processed_frame, RegionDetector
+from utils import save_intruder_image, save_intruder_clip, face_quality, send_telegram_alert
 from dashboard.app import app, set_annotated_frame_provider
 
 
@@ -27,12 +27,28 @@ TELEGRAM_TOKEN = cfg.get("telegram_token", "")
 TELEGRAM_CHAT_ID = cfg.get("telegram_chat_id", "")
 INTRUDER_SAVE_PATH = cfg.get("save_intruder_path", "data/intruders")
 ALERT_COOLDOWN = 30
+SAVE_INTRUDER_CLIP = cfg.get("save_intruder_clip", True)
+CLIP_PRE_SECONDS = cfg.get("clip_pre_seconds", 5)
+CLIP_POST_SECONDS = cfg.get("clip_post_seconds", 5)
+CLIP_FPS = cfg.get("clip_fps", 10)
+CLIP_MAX_WIDTH = cfg.get("clip_max_width", 960)
+CLIP_BUFFER_MB = cfg.get("clip_buffer_max_mb")  # default: sized to fit the clip window
+CLIP_FRAME_KB = 200  # generous estimate for one JPEG at clip_max_width
+
+#detection zones are keyed by camera source ("default" applies to any camera)
+_zones_cfg = cfg.get("detection_zones", {})
+DETECTION_ZONES = _zones_cfg.get(str(CAM_INDEX), _zones_cfg.get("default", []))
+TILE_DETECTION = cfg.get("tile_detection", True)
+TILE_SIZE = cfg.get("tile_size", 640)
+TILE_DET_SIZE = cfg.get("tile_det_size", 320)
+MAX_TILES = cfg.get("max_tiles", 1)
 
 
 #global state
 global_unknown_start = None
 global_last_alert_time = 0
 intruder_alerted = False
+best_snapshot = None  # (quality, processed frame) for the current unknown session
 
 global_user_embeddings = None
 global_label_map = {}
@@ -59,12 +75,37 @@ def retrain_recognizer():
     return True
 
 
+#write pre/post-event clip (runs in its own thread, off the detection loop)
+def write_intruder_clip(cam, event_time, clip_path):
+    time.sleep(CLIP_POST_SECONDS)
+    frames = cam.get_buffered(event_time - CLIP_PRE_SECONDS, event_time + CLIP_POST_SECONDS)
+    save_intruder_clip(frames, clip_path, CLIP_FPS)
+
+
 #background detection loop
 def detection_loop():
-    global global_unknown_start, global_last_alert_time, intruder_alerted
+    global global_unknown_start, global_last_alert_time, intruder_alerted, best_snapshot
 
     print("[INFO] Starting Camera Stream...")
-    cam = CameraStream(src=CAM_INDEX)
+    buffer_seconds = CLIP_PRE_SECONDS + CLIP_POST_SECONDS + 1 if SAVE_INTRUDER_CLIP else 0
+    if CLIP_BUFFER_MB:
+        buffer_max_bytes = int(CLIP_BUFFER_MB * 1024 * 1024)
+    else:
+        buffer_max_bytes = int(buffer_seconds * CLIP_FPS * CLIP_FRAME_KB * 1024)
+    cam = CameraStream(
+        src=CAM_INDEX,
+        buffer_seconds=buffer_seconds,
+        buffer_fps=CLIP_FPS,
+        buffer_max_bytes=buffer_max_bytes,
+        buffer_max_width=CLIP_MAX_WIDTH
+    )
+
+    detector = RegionDetector(
+        zones=DETECTION_ZONES,
+        tile_size=TILE_SIZE,
+        tile_det_size=TILE_DET_SIZE,
+        max_tiles=MAX_TILES if TILE_DETECTION else 0
+    )
 
     print("[INFO] Loading recognizer...")
     retrain_recognizer()
@@ -95,7 +136,8 @@ def detection_loop():
                 frame,
                 user_embeddings,
                 label_map,
-                threshold=MATCH_THRESHOLD
+                threshold=MATCH_THRESHOLD,
+                detector=detector
             )
 
         #intruder duration logic
@@ -111,6 +153,14 @@ def detection_loop():
             if global_unknown_start is None:
                 global_unknown_start = time.time()
                 intruder_alerted = False  # Reset for new session
+                best_snapshot = None
+
+            #keep the sharpest, most confident face frame seen this session
+            if not intruder_alerted:
+                quality = max(face_quality(frame, r["box"], r.get("det_score", 1.0)) for r in results)
+                if best_snapshot is None or quality > best_snapshot[0]:
+                    processed = get_processed_frame()
+                    best_snapshot = (quality, processed if processed is not None else frame)
 
             elapsed = time.time() - global_unknown_start
 
@@ -118,12 +168,17 @@ def detection_loop():
             if elapsed >= UNKNOWN_DURATION and not intruder_alerted:
                 print("[ALERT] Intruder detected > threshold duration")
 
-                #save intruder snapshot (processed frame ideally)
-                processed = get_processed_frame()
-                if processed is not None:
-                    intr_path = save_intruder_image(processed, base_path=INTRUDER_SAVE_PATH)
-                else:
-                    intr_path = save_intruder_image(frame, base_path=INTRUDER_SAVE_PATH)
+                #save best intruder snapshot of the session (processed frame)
+                intr_path = save_intruder_image(best_snapshot[1], base_path=INTRUDER_SAVE_PATH)
+
+                #pre/post-event clip from the camera ring buffer
+                if SAVE_INTRUDER_CLIP:
+                    clip_path = os.path.splitext(intr_path)[0] + ".avi"
+                    threading.Thread(
+                        target=write_intruder_clip,
+                        args=(cam, time.time(), clip_path),
+                        daemon=True
+                    ).start()
                 
                 #mark as alerted so we don't spam photos
                 intruder_alerted = True
@@ -138,6 +193,7 @@ def detection_loop():
             #reset everything when intruder leaves or is recognized
             global_unknown_start = None
             intruder_alerted = False
+            best_snapshot = None
 
         time.sleep(0.01)
 
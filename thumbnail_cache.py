@@ -0,0 +1,102 @@
+import cv2
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+class ThumbnailCache:
+    """
+    In-memory JPEG thumbnail cache with LRU eviction, bounded by total bytes.
+    Thumbnails are generated in a background thread pool; entries are keyed by
+    path + mtime + size so a rewritten image gets a fresh thumbnail.
+    """
+
+    def __init__(self, max_size=200, max_bytes=16 * 1024 * 1024, workers=2, quality=80):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumb")
+
+    def _key(self, path):
+        st = os.stat(path)
+        return (path, st.st_mtime_ns, st.st_size), st.st_mtime
+
+    def _generate(self, key):
+        try:
+            return self._render(key)
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+
+    def _render(self, key):
+        img = cv2.imread(key[0])
+        if img is None:
+            return None
+
+        h, w = img.shape[:2]
+        scale = self.max_size / max(h, w)
+        if scale < 1:
+            img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+        ret, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ret:
+            return None
+        data = buffer.tobytes()
+
+        with self.lock:
+            if len(data) <= self.max_bytes and key not in self.cache:
+                self.cache[key] = data
+                self.cache_bytes += len(data)
+                while self.cache_bytes > self.max_bytes:
+                    _, old = self.cache.popitem(last=False)
+                    self.cache_bytes -= len(old)
+        return data
+
+    def _submit(self, key):
+        #caller holds self.lock
+        future = self.pending.get(key)
+        if future is None:
+            future = self.pool.submit(self._generate, key)
+            self.pending[key] = future
+        return future
+
+    def get(self, path):
+        """
+        Return (jpeg_bytes, mtime) for the thumbnail of path, generating it if needed.
+        Returns None if the image is missing or unreadable.
+        """
+        try:
+            key, mtime = self._key(path)
+        except OSError:
+            return None
+
+        with self.lock:
+            data = self.cache.get(key)
+            if data is not None:
+                self.cache.move_to_end(key)
+                return data, mtime
+            future = self._submit(key)
+
+        try:
+            data = future.result()
+        except Exception as e:
+            print(f"[thumbs] Failed to generate thumbnail for {path}: {e}")
+            return None
+        if data is None:
+            return None
+        return data, mtime
+
+    def prefetch(self, paths):
+        """Queue thumbnails for generation without waiting (e.g. for the page being rendered)."""
+        for path in paths:
+            try:
+                key, _ = self._key(path)
+            except OSError:
+                continue
+            with self.lock:
+                if key not in self.cache:
+                    self._submit(key)
@@ -3,43 +3,106 @@ import cv2
 import time
 import requests
 import shutil
+import struct
+import threading
+import numpy as np
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data", "users")
 INTRUDER_DIR = os.path.join(BASE_DIR, "data", "intruders")
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg')
+
+#directory listing cache (invalidated by the write helpers below)
+_listing_cache = {}
+_listing_generation = {}  # bumped on every invalidation, guards against storing stale listings
+_listing_epoch = 0        # bumped when all listings are invalidated
+_listing_lock = threading.Lock()
+
+def _cached_listing(path, loader):
+    """
+    Return the cached listing for path, loading it with loader(path) on a miss.
+    The loader returns None for a missing folder; that result is not cached.
+    """
+    key = os.path.abspath(path)
+    with _listing_lock:
+        if key in _listing_cache:
+            return _listing_cache[key]
+        generation = (_listing_epoch, _listing_generation.get(key, 0))
+    entries = loader(key)
+    if entries is None:
+        return []
+    with _listing_lock:
+        #only store if nothing invalidated this folder while we were reading it
+        if generation == (_listing_epoch, _listing_generation.get(key, 0)):
+            _listing_cache[key] = entries
+    return entries
+
+def invalidate_listing(*paths):
+    """Drop cached listings for the given folders (all folders if none given)."""
+    global _listing_epoch
+    with _listing_lock:
+        if not paths:
+            _listing_cache.clear()
+            _listing_epoch += 1
+        for path in paths:
+            key = os.path.abspath(path)
+            _listing_cache.pop(key, None)
+            _listing_generation[key] = _listing_generation.get(key, 0) + 1
+
+def paginate(items, page, per_page):
+    """Return (items on page, clamped page number, total pages)."""
+    total_pages = max(1, (len(items) + per_page - 1) // per_page)
+    page = min(max(page, 1), total_pages)
+    start = (page - 1) * per_page
+    return items[start:start + per_page], page, total_pages
 
 def create_user_folder(username):
     folder_path = os.path.join(DATA_DIR, username)
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
+        invalidate_listing(DATA_DIR)
     return folder_path
 
 def save_user_image(frame, username, img_num):
     user_folder = os.path.join(DATA_DIR, username)
     if not os.path.exists(user_folder):
         os.makedirs(user_folder)
+        invalidate_listing(DATA_DIR)
     path = os.path.join(user_folder, f"img_{img_num}.jpg")
     cv2.imwrite(path, frame)
+    invalidate_listing(user_folder)
     print(f"Saved {path}")
 
 def get_all_users():
-    if not os.path.exists(DATA_DIR):
-        return []
-    return [d for d in os.listdir(DATA_DIR) if os.path.isdir(os.path.join(DATA_DIR, d))]
+    def load(path):
+        if not os.path.isdir(path):
+            return None
+        return sorted(d for d in os.listdir(path) if os.path.isdir(os.path.join(path, d)))
+    return _cached_listing(DATA_DIR, load)
 
 def delete_user_data(username):
     user_folder = os.path.join(DATA_DIR, username)
     if os.path.exists(user_folder):
         shutil.rmtree(user_folder)
+        invalidate_listing(DATA_DIR, user_folder)
         return True
     return False
 
 def get_user_images(username):
-    user_folder = os.path.join(DATA_DIR, username)
-    if not os.path.exists(user_folder):
-        return []
-    return [f for f in os.listdir(user_folder) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+    def load(path):
+        if not os.path.isdir(path):
+            return None
+        return sorted(f for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTS))
+    return _cached_listing(os.path.join(DATA_DIR, username), load)
+
+def get_intruder_files(base_path=INTRUDER_DIR):
+    """Intruder snapshots and clips, newest first (names embed the timestamp)."""
+    def load(path):
+        if not os.path.isdir(path):
+            return None
+        return sorted((f for f in os.listdir(path) if not f.startswith('.')), reverse=True)
+    return _cached_listing(base_path, load)
 
 def ensure_folder(path):
     if not os.path.exists(path):
@@ -52,9 +115,114 @@ def save_intruder_image(frame, base_path="data/intruders"):
     filename = f"intruder_{ts}.jpg"
     path = os.path.join(base_path, filename)
     cv2.imwrite(path, frame)
+    invalidate_listing(base_path)
     print(f"[INTRUDER] Saved {path}")
     return path
 
+def _write_mjpeg_avi(path, chunks, fps, width, height):
+    """Mux JPEG frames into an MJPEG AVI container (no re-encoding)."""
+    n = len(chunks)
+    max_chunk = max(len(c) for c in chunks)
+
+    movi = bytearray(b"movi")
+    index = bytearray()
+    for data in chunks:
+        index += b"00dc" + struct.pack("<III", 0x10, len(movi), len(data))
+        movi += b"00dc" + struct.pack("<I", len(data)) + data
+        if len(data) % 2:
+            movi += b"\0"
+
+    avih = struct.pack(
+        "<14I", int(1000000 / fps), int(max_chunk * fps), 0, 0x10, n, 0, 1,
+        max_chunk, width, height, 0, 0, 0, 0
+    )
+    strh = b"vidsMJPG" + struct.pack(
+        "<IHHIIIIIIIIhhhh", 0, 0, 0, 0, 1000, int(round(fps * 1000)), 0, n, max_chunk, 0xFFFFFFFF, 0, 0, 0, width, height
+    )
+    strf = struct.pack("<IiiHH4sIiiII", 40, width, height, 1, 24, b"MJPG", width * height * 3, 0, 0, 0, 0)
+
+    def chunk(fourcc, payload):
+        return fourcc + struct.pack("<I", len(payload)) + payload
+
+    def lst(fourcc, payload):
+        return b"LIST" + struct.pack("<I", len(payload) + 4) + fourcc + payload
+
+    strl = lst(b"strl", chunk(b"strh", strh) + chunk(b"strf", strf))
+    hdrl = lst(b"hdrl", chunk(b"avih", avih) + strl)
+    body = b"AVI " + hdrl + b"LIST" + struct.pack("<I", len(movi)) + bytes(movi) + chunk(b"idx1", bytes(index))
+
+    with open(path, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", len(body)) + body)
+
+def save_intruder_clip(jpeg_frames, path, fps):
+    """
+    Write buffered (timestamp, jpeg) frames as an MJPEG AVI at the given fps.
+    Frames are copied as-is; gaps (dropped or evicted frames) are filled by
+    repeating the previous frame so playback keeps real time.
+    """
+    if not jpeg_frames:
+        print("[INTRUDER] No buffered frames, clip skipped.")
+        return None
+
+    first = cv2.imdecode(np.frombuffer(jpeg_frames[0][1], np.uint8), cv2.IMREAD_COLOR)
+    if first is None:
+        print("[INTRUDER] Unreadable buffered frame, clip skipped.")
+        return None
+    height, width = first.shape[:2]
+
+    #place frames on a fixed fps grid using their capture timestamps
+    start = jpeg_frames[0][0]
+    slots = int(round((jpeg_frames[-1][0] - start) * fps)) + 1
+    chunks = []
+    idx = 0
+    for k in range(slots):
+        t = start + k / fps
+        while idx + 1 < len(jpeg_frames) and jpeg_frames[idx + 1][0] <= t + 0.5 / fps:
+            idx += 1
+        chunks.append(jpeg_frames[idx][1])
+
+    ensure_folder(os.path.dirname(path) or ".")
+    _write_mjpeg_avi(path, chunks, fps, width, height)
+    invalidate_listing(os.path.dirname(path) or ".")
+    print(f"[INTRUDER] Saved clip {path} ({len(jpeg_frames)} frames, {slots / fps:.1f}s)")
+    return path
+
+def read_intruder_clip(path):
+    """Return (fps, [jpeg bytes]) from an MJPEG AVI written by save_intruder_clip."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[0:4] != b"RIFF" or data[8:12] != b"AVI ":
+        return None, []
+
+    avih = data.find(b"avih")
+    usec_per_frame = struct.unpack_from("<I", data, avih + 8)[0] if avih >= 0 else 0
+    fps = 1000000 / usec_per_frame if usec_per_frame else 10
+
+    frames = []
+    pos = data.find(b"movi") + 4
+    while 0 < pos <= len(data) - 8:
+        fourcc, size = data[pos:pos + 4], struct.unpack_from("<I", data, pos + 4)[0]
+        if fourcc == b"idx1":
+            break
+        if fourcc == b"00dc":
+            frames.append(data[pos + 8:pos + 8 + size])
+        pos += 8 + size + (size % 2)
+    return fps, frames
+
+def face_quality(frame, box, det_score=1.0):
+    """
+    Score a face crop for snapshot selection: Laplacian variance (sharpness)
+    weighted by the detector confidence. Higher is better.
+    """
+    x, y, w, h = box
+    x2, y2 = x + w, y + h
+    crop = frame[max(y, 0):y2, max(x, 0):x2]
+    if crop.size == 0:
+        return 0.0
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    return float(sharpness * det_score)
+
 def send_telegram_alert(image_path, bot_token, chat_id, caption="Intruder Detected!"):
     if not bot_token or not chat_id:
         print("[telegram] token or chat_id not provided. Skipping telegram.")